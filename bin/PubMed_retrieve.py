@@ -5,6 +5,7 @@
 # The number of past days for update searching as well as the batch size of papers 
 # (return up to this number of papers for each search) can be specified as follows:
 # python3 PubMed_retrieve.py --days_before_today 10 --batch_size 100 --email your_email
+# An NCBI API key can optionally be given with --api_key your_api_key to raise the request rate limit.
 
 # Created by Cyan Ching, PhD student at The Physical Chemistry Curie Lab of Institut Curie in France
 # This code is up to date as of October 2024.
@@ -12,60 +13,42 @@
 import requests
 from datetime import datetime, timedelta
 from Bio import Entrez
-import configparser
+from lxml import etree
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import threading
+import time
+from urllib.error import URLError
+from http.client import HTTPException
 import argparse
+import io
 import os
 import sys
-
-def print_header():
-    header = r"""
-     ______                _            
-    \  ___)              | |           
-     \ \__   ___ ___ _  _| |_  _  _  _ 
-      > > \ / / (   ) |/     \| || || |
-     / /_\ v /| || || ( (| |) ) \| |/ |
-    /_____> <  \_)\_)\_)_   _/ \_   _/ 
-         / ^ \           | |     | |   
-        /_/ \_\          |_|     |_|   
-    
-    Welcome to Scitify - Your Custom New Scientific Publication Notifier!
-    
-    Author: Cyan Ching, PhD Student at Institut Curie
-    Version: 1.0 | Date: October 2024
-    
-    """
-    print(header)
+from scitify_banner import print_header
+import scitify_cache
+from scitify_retry import with_retries
 
 if __name__ == "__main__":
     print_header()
 
 # Load keywords from the text file
 def load_keywords_from_file(file_path):
-    config = configparser.ConfigParser(allow_no_value=True)
-    
     if not os.path.exists(file_path):
         return None  # Return None if the file doesn't exist
-    
-    config.read(file_path)
-
-    keywords = {
-        "keywords": [],
-        "exclude_keywords": [],
-        "required_keywords": [],
-        "journals_of_interest": []  # Optional
-    }
-
-    if "keywords" in config:
-        keywords["keywords"] = list(config["keywords"].keys())
-
-    if "exclude_keywords" in config:
-        keywords["exclude_keywords"] = list(config["exclude_keywords"].keys())
-
-    if "required_keywords" in config:
-        keywords["required_keywords"] = list(config["required_keywords"].keys())
 
-    if "journals_of_interest" in config:
-        keywords["journals_of_interest"] = list(config["journals_of_interest"].keys())
+    # Read the [section] headers and their entries in one pass, keeping the file order
+    sections = {}
+    current = None
+    with open(file_path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith(("#", ";")):
+                continue
+            if line.startswith("[") and line.endswith("]"):
+                current = sections.setdefault(line[1:-1].strip(), [])
+            elif current is not None:
+                current.append(line.split("=", 1)[0].strip())
+
+    keywords = {key: sections.get(key, []) for key in ("keywords", "exclude_keywords", "required_keywords", "journals_of_interest")}
 
     return keywords
 
@@ -74,7 +57,8 @@ parser = argparse.ArgumentParser(
     description=(
         "This function of Scitify searches PubMed for papers matching keywords.\n"
         "Both --days_before_today, --batch_size, and --email flags are required.\n"
-        "The keywords should be defined in '/Scitify/config/PubMed_keywords.txt'.\n\n"
+        "The keywords should be defined in '/Scitify/config/PubMed_keywords.txt'.\n"
+        "An optional NCBI --api_key raises the PubMed request limit from 3 to 10 per second.\n\n"
         "Example usage:\n"
         "  python3 PubMed_retrieve.py --days_before_today 10 --batch_size 100 --email your_email\n\n"
         "Created by Cyan Ching, PhD student at The Physical Chemistry Curie Lab of Institut Curie in France.\n"
@@ -88,6 +72,8 @@ parser = argparse.ArgumentParser(
 parser.add_argument('--days_before_today', type=int, help='Number of days before today to search for papers.')
 parser.add_argument('--batch_size', type=int, help='Number of entries to fetch per batch.')
 parser.add_argument('--email', type=str, help='Email to be used for PubMed queries (required).')
+parser.add_argument('--api_key', type=str, help='NCBI API key, raising the request limit from 3 to 10 per second (optional).')
+parser.add_argument('--include_seen', action='store_true', help='Also write the papers already written by a previous run.')
 parser.add_argument('--quiet', action='store_true', help='Suppress output of retrieved and excluded lines.')
 parser.add_argument('--help', action='help', help='Show this help message and exit.')
 
@@ -124,6 +110,10 @@ if errors:
 days_before_today = args.days_before_today
 batch_size = args.batch_size
 Entrez.email = args.email
+if args.api_key:
+    Entrez.api_key = args.api_key
+# Failed requests are retried with backoff by with_retries, so Entrez should not retry them itself
+Entrez.max_tries = 1
 
 # Define search parameters
 keywords = keywords_dict["keywords"]
@@ -131,8 +121,17 @@ exclude_keywords = keywords_dict["exclude_keywords"]
 required_keywords = keywords_dict["required_keywords"]
 journals_of_interest = keywords_dict["journals_of_interest"]
 
-start_date = (datetime.now() - timedelta(days=days_before_today)).strftime('%Y/%m/%d')
-end_date = datetime.now().strftime('%Y/%m/%d')  # Include today in the end date
+# Always search the whole window: papers can be listed days after their date, so a window narrowed to the days
+# since the previous run would miss them for good. Repeats are skipped through the IDs of the papers already seen instead
+run_started = datetime.now()
+window_start = run_started - timedelta(days=days_before_today)
+
+start_date = window_start.strftime('%Y/%m/%d')
+end_date = run_started.strftime('%Y/%m/%d')  # Include today in the end date
+
+# Entries written by previous runs are skipped, so overlapping windows do not repeat them
+seen_ids = {} if args.include_seen else scitify_cache.load_seen_ids("pubmed")
+retrieval_failed = False
 
 # Month mapping for converting text month names to numbers
 month_mapping = {
@@ -140,124 +139,215 @@ month_mapping = {
     "jul": "07", "aug": "08", "sep": "09", "oct": "10", "nov": "11", "dec": "12"
 }
 
-entries = []
-
-# Search each keyword individually
-for keyword in keywords:
-    retstart = 0
-
-    # Construct PubMed query for the current keyword
-    query = f"({keyword})"
-    
-    # Only include the journal filter if journals of interest are specified
-    if journals_of_interest:
-        query += f" AND ({' OR '.join([f'{journal}[Journal]' for journal in journals_of_interest])})"
-    
-    if exclude_keywords:
-        query += " NOT " + " NOT ".join(exclude_keywords)  # Exclude specific keywords if any
-
-    # Use Entrez to search PubMed and paginate
-    while True:
-        try:
-            search_handle = Entrez.esearch(db="pubmed", term=query, datetype="pdat", mindate=start_date, maxdate=end_date, retmax=batch_size, retstart=retstart)
-            search_results = Entrez.read(search_handle)
-            search_handle.close()
-        except Exception as e:
-            print(f"Error querying PubMed: {e}")
+# Maximum number of EFetch pages retrieved in parallel
+max_workers = 8
+
+# Minimum interval between NCBI requests: 10 per second with an API key, 3 per second without
+request_interval = 0.1 if args.api_key else 0.34
+request_lock = threading.Lock()
+last_request_time = 0.0
+
+# Block until another request can be sent without exceeding the NCBI rate limit, shared by all worker threads
+def wait_for_rate_limit():
+    global last_request_time
+    with request_lock:
+        wait = last_request_time + request_interval - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        last_request_time = time.monotonic()
+
+# Search PubMed once, keeping the results on the Entrez history server; transient errors are retried with backoff
+@with_retries(URLError, HTTPException, ConnectionError)
+def _esearch(query):
+    wait_for_rate_limit()
+    search_handle = Entrez.esearch(db="pubmed", term=query, datetype="pdat", mindate=start_date, maxdate=end_date, usehistory="y")
+    search_results = Entrez.read(search_handle)
+    search_handle.close()
+    return search_results
+
+# Download one batch of results from the Entrez history server; transient errors are retried with backoff
+@with_retries(URLError, HTTPException, ConnectionError)
+def _efetch(webenv, query_key, retstart):
+    wait_for_rate_limit()
+    fetch_handle = Entrez.efetch(db="pubmed", rettype="medline", retmode="xml", retstart=retstart, retmax=batch_size, webenv=webenv, query_key=query_key)
+    content = fetch_handle.read()
+    fetch_handle.close()
+    return content
+
+# Entries are written to the output file as soon as they are formatted
+output_file = "../output/latest_pubmed_entries.txt"
+entry_count = 0
+already_sent_count = 0  # Matching papers skipped because a previous run already sent them
+seen_pmids = set()
+
+# Return the text of a child element with any inline markup such as <i> flattened, or a default
+def find_text(elem, path, default=''):
+    child = elem.find(path)
+    if child is None:
+        return default
+    return ''.join(child.itertext())
+
+# Extract the fields used in the output from one <PubmedArticle> element
+def extract(elem):
+    article_info = elem.find('MedlineCitation/Article')
+    pub_date = article_info.find('Journal/JournalIssue/PubDate')
+
+    # Keep the DOI from the ELocationIDs to construct the full-text link
+    doi = None
+    for eloc in article_info.iterfind('ELocationID'):
+        if eloc.get('EIdType') == 'doi':
+            doi = eloc.text
             break
 
-        # Extract IDs and fetch details
-        pubmed_ids = search_results['IdList']
-        if not pubmed_ids:
-            break
-
-        try:
-            fetch_handle = Entrez.efetch(db="pubmed", id=pubmed_ids, rettype="medline", retmode="xml")
-            fetch_results = Entrez.read(fetch_handle)
-            fetch_handle.close()
-        except Exception as e:
-            print(f"Error fetching PubMed entries: {e}")
-            break
-
-        # Iterate through each retrieved paper
-        for article in fetch_results['PubmedArticle']:
-            article_info = article['MedlineCitation']['Article']
-            journal = article_info['Journal']['Title'].lower()
-
-            # If journals of interest are specified, filter by journal
-            if not journals_of_interest or any(journal_name.lower() in journal for journal_name in journals_of_interest):
-                title = article_info.get('ArticleTitle', 'No Title')
-                authors = ", ".join(
-                    [
-                        f"{author['LastName']} {author.get('Initials', '')}"
-                        for author in article_info.get('AuthorList', [])
-                        if 'LastName' in author
-                    ]
-                )
-                pub_date = article_info['Journal']['JournalIssue']['PubDate']
-
-                # Construct the full date if available (year, month, day)
-                year = pub_date.get('Year', 'No Year')
-                month = pub_date.get('Month', '').lower()[:3]  # Convert to lowercase and get the first three letters
-                day = pub_date.get('Day', '')
-
-                # Convert the month name to a numeric value
-                month_num = month_mapping.get(month, "01")  # Default to January if not found
-
-                # Format the date as YYYY-MM-DD
-                if year != 'No Year':
-                    date_str = f"{year}-{month_num}-{day.zfill(2) if day else '01'}"
-                else:
-                    date_str = "Unknown Date"
-
-                abstract = article_info.get('Abstract', {}).get('AbstractText', ['No Abstract'])[0]
-
-                # Get DOI or ELocationID to construct full-text link
-                elocation_ids = article_info.get('ELocationID', [])
-                doi = None
-                for eloc in elocation_ids:
-                    if eloc.attributes.get('EIdType') == 'doi':
-                        doi = eloc
-                        break
-
-                # Construct full-text link from DOI if available
-                if doi:
-                    full_text_url = f"https://doi.org/{doi}"
-                else:
-                    full_text_url = "Full text link not available"
-
-                # Create entry for each paper
-                entry = (
-                    f"Title: {title}\n"
-                    f"Authors: {authors}\n"
-                    f"Journal: {journal.capitalize()}\n"
-                    f"Date: {date_str}\n"
-                    f"URL: {full_text_url}\n"
-                    f"Abstract: {abstract}\n\n"
-                )
-                entries.append(entry)
-
-                # Only print if not in quiet mode
-                if not args.quiet:
-                    print(f"Retrieved: {title}")
-
-        # Update retstart for the next batch
-        retstart += batch_size
-
-        # If the total results have been fetched, break the loop
-        if retstart >= int(search_results['Count']):
-            break
+    return {
+        "pmid": elem.findtext('MedlineCitation/PMID'),
+        "title": find_text(article_info, 'ArticleTitle', 'No Title'),
+        "authors": [
+            (author.findtext('LastName'), author.findtext('Initials', ''))
+            for author in article_info.iterfind('AuthorList/Author')
+            if author.find('LastName') is not None
+        ],
+        "journal": find_text(article_info, 'Journal/Title'),
+        "year": pub_date.findtext('Year', 'No Year'),
+        "month": pub_date.findtext('Month', ''),
+        "day": pub_date.findtext('Day', ''),
+        "abstract": find_text(article_info, 'Abstract/AbstractText', 'No Abstract'),
+        "doi": doi,
+    }
 
-# Write the entries to a text file
-if entries:
-    with open("../output/latest_pubmed_entries.txt", "w") as file:
-        file.writelines(entries)
-    print(f"{len(entries)} entries successfully written to '/Scitify/output/latest_pubmed_entries.txt'.")
+# Fetch one batch of results from the Entrez history server, returning None if the request fails
+def fetch_page(webenv, query_key, count, retstart):
+    # The WebEnv changes on every run, so cache the batch under the query, date window, total count, and offset instead
+    cache_key = f"pubmed:{query}:{start_date}:{end_date}:{count}:{retstart}:{batch_size}"
+    try:
+        content = scitify_cache.get_cached(cache_key)
+        from_cache = content is not None
+        if not from_cache:
+            content = _efetch(webenv, query_key, retstart)
+
+        articles = []
+        # Stream the articles and discard each element once extracted, so the full tree is never held in memory
+        for _, elem in etree.iterparse(io.BytesIO(content), tag='PubmedArticle'):
+            articles.append(extract(elem))
+            elem.clear()
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+
+        # Only cache batches with articles, so that an empty or failed response is retried on the next run
+        if articles and not from_cache:
+            scitify_cache.store(cache_key, content)
+        return articles
+    except Exception as e:
+        print(f"Error fetching PubMed entries: {e}")
+        return None
+
+# Format the retrieved papers of one batch and write them to 'output'
+def process_articles(articles):
+    global entry_count, already_sent_count
+    for article in articles:
+        # Skip papers already seen on another page
+        if article['pmid'] in seen_pmids:
+            continue
+        seen_pmids.add(article['pmid'])
+
+        # Skip papers written by a previous run
+        if article['pmid'] in seen_ids:
+            already_sent_count += 1
+            continue
+
+        journal = article['journal'].lower()
+
+        title = article['title']
+        authors = ", ".join(
+            [f"{last_name} {initials}" for last_name, initials in article['authors']]
+        )
+
+        # Construct the full date if available (year, month, day)
+        year = article['year']
+        month = article['month'].lower()[:3]  # Convert to lowercase and get the first three letters
+        day = article['day']
+
+        # Convert the month name to a numeric value
+        month_num = month_mapping.get(month, "01")  # Default to January if not found
+
+        # Format the date as YYYY-MM-DD
+        if year != 'No Year':
+            date_str = f"{year}-{month_num}-{day.zfill(2) if day else '01'}"
+        else:
+            date_str = "Unknown Date"
+
+        abstract = article['abstract']
+
+        # Construct full-text link from DOI if available
+        if article['doi']:
+            full_text_url = f"https://doi.org/{article['doi']}"
+        else:
+            full_text_url = "Full text link not available"
+
+        # Create entry for each paper
+        entry = (
+            f"Title: {title}\n"
+            f"Authors: {authors}\n"
+            f"Journal: {journal.capitalize()}\n"
+            f"Date: {date_str}\n"
+            f"URL: {full_text_url}\n"
+            f"Abstract: {abstract}\n\n"
+        )
+        output.write(entry)
+        entry_count += 1
+        seen_ids[article['pmid']] = run_started
+
+        # Only print if not in quiet mode
+        if not args.quiet:
+            print(f"Retrieved: {title}")
+
+# Construct a single PubMed query matching any of the keywords
+query = "(" + " OR ".join(f"({keyword})" for keyword in keywords) + ")"
+
+# Only include the journal filter if journals of interest are specified (applied by PubMed itself, not re-checked here)
+if journals_of_interest:
+    query += f" AND ({' OR '.join([f'{journal}[Journal]' for journal in journals_of_interest])})"
+
+if exclude_keywords:
+    query += " NOT (" + " OR ".join(f"({exclude_keyword})" for exclude_keyword in exclude_keywords) + ")"  # Exclude specific keywords if any
+
+# Use Entrez to search PubMed once, keeping the results on the Entrez history server
+try:
+    search_results = _esearch(query)
+    webenv = search_results["WebEnv"]
+    query_key = search_results["QueryKey"]
+    count = int(search_results["Count"])
+except Exception as e:
+    print(f"Error querying PubMed: {e}")
+    retrieval_failed = True
+    webenv = query_key = None
+    count = 0  # Nothing to fetch
+
+# Fetch the batches concurrently from the history server; results are processed and written here in the main thread
+with open(output_file, "w", buffering=1 << 20) as output, ThreadPoolExecutor(max_workers=max_workers) as executor:
+    futures = [executor.submit(fetch_page, webenv, query_key, count, retstart) for retstart in range(0, count, batch_size)]
+    # Handle each batch as soon as it arrives rather than in offset order; duplicates are skipped by PMID
+    for future in as_completed(futures):
+        articles = future.result()
+        if articles is not None:
+            process_articles(articles)
+        else:
+            retrieval_failed = True
+
+# Report the result, removing the output file again if no entry matched
+if entry_count:
+    print(f"{entry_count} entries successfully written to '/Scitify/output/latest_pubmed_entries.txt'.")
 else:
-    print("No matching entries found for the given keywords.")
-
-
-
-
-
-
+    os.remove(output_file)
+    if already_sent_count:
+        print(f"No new entries found: the {already_sent_count} matching entries were already sent by a previous run.")
+    else:
+        print("No matching entries found for the given keywords.")
+
+# Record the papers written by a complete run, so that the next one skips them
+if not retrieval_failed:
+    scitify_cache.save_seen_ids("pubmed", seen_ids, run_started - timedelta(days=days_before_today))
+
+    # Report a run that only found papers already sent, so that it is not retried
+    if not entry_count and already_sent_count:
+        sys.exit(scitify_cache.nothing_new_status)
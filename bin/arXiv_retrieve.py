@@ -9,61 +9,59 @@
 # Copyright 2024, Cyan Ching, a PhD student at The Physical Chemistry Curie Lab of Institut Curie in France
 # This code is up to date as of October 2024.
 
-import feedparser
+import asyncio
+import httpx
 from datetime import datetime, timedelta
 import urllib.parse
-import configparser
+from lxml import etree
 import argparse
 import os
+import re
 import sys
-
-def print_header():
-    header = r"""
-     ______                _            
-    \  ___)              | |           
-     \ \__   ___ ___ _  _| |_  _  _  _ 
-      > > \ / / (   ) |/     \| || || |
-     / /_\ v /| || || ( (| |) ) \| |/ |
-    /_____> <  \_)\_)\_)_   _/ \_   _/ 
-         / ^ \           | |     | |   
-        /_/ \_\          |_|     |_|   
-    
-    Welcome to Scitify - Your Custom New Scientific Publication Notifier!
-    
-    Author: Cyan Ching, PhD Student at Institut Curie
-    Version: 1.0 | Date: October 2024
-    
-    """
-    print(header)
+from scitify_banner import print_header
+import scitify_cache
+from scitify_retry import with_retries
 
 if __name__ == "__main__":
     print_header()
 
 # Load keywords from the text file
 def load_keywords_from_file(file_path):
-    config = configparser.ConfigParser(allow_no_value=True)
-    
     if not os.path.exists(file_path):
         return None  # Return None if the file doesn't exist
-    
-    config.read(file_path)
 
-    keywords = {
-        "keywords": [],
-        "exclude_keywords": [],
-        "required_keywords": []
-    }
+    # Read the [section] headers and their entries in one pass, keeping the file order
+    sections = {}
+    current = None
+    with open(file_path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith(("#", ";")):
+                continue
+            if line.startswith("[") and line.endswith("]"):
+                current = sections.setdefault(line[1:-1].strip(), [])
+            elif current is not None:
+                current.append(line.split("=", 1)[0].strip())
 
-    if "keywords" in config:
-        keywords["keywords"] = list(config["keywords"].keys())
+    keywords = {key: sections.get(key, []) for key in ("keywords", "exclude_keywords", "required_keywords")}
 
-    if "exclude_keywords" in config:
-        keywords["exclude_keywords"] = list(config["exclude_keywords"].keys())
+    return keywords
 
-    if "required_keywords" in config:
-        keywords["required_keywords"] = list(config["required_keywords"].keys())
+# Compile the (casefolded) keywords into a single regular expression matching any of them, or None if there are no keywords
+def build_pattern(keyword_list):
+    if not keyword_list:
+        return None
+    return re.compile("|".join(map(re.escape, keyword_list)))
 
-    return keywords
+# Check whether any keyword of the pattern occurs in the text, stopping at the first match
+def contains_any(pattern, text):
+    return pattern is not None and pattern.search(text) is not None
+
+# Return the distinct keywords of the pattern occurring in the text, in a single scan
+def matched_keywords(pattern, text):
+    if pattern is None:
+        return set()
+    return set(pattern.findall(text))
 
 # Define the command-line arguments and --help flag
 parser = argparse.ArgumentParser(
@@ -83,6 +81,7 @@ parser = argparse.ArgumentParser(
 # Define optional arguments 
 parser.add_argument('--days_before_today', type=int, help='Number of days before today to search for papers.')
 parser.add_argument('--batch_size', type=int, help='Number of entries to fetch per batch.')
+parser.add_argument('--include_seen', action='store_true', help='Also write the papers already written by a previous run.')
 parser.add_argument('--quiet', action='store_true', help='Suppress output of retrieved and excluded lines.')
 parser.add_argument('--help', action='store_true', help='Show this help message and exit.')
 
@@ -123,74 +122,171 @@ keywords = keywords_dict["keywords"]
 exclude_keywords = keywords_dict["exclude_keywords"]
 required_keywords = keywords_dict["required_keywords"]
 
-entries = {}
-processed_links = set()  # To keep track of processed entries
-
-# Iterate over keywords to search separately and use specific fields
-for keyword in keywords:
-    offset = 0  # Reset offset for each keyword
+# Casefold the keywords once instead of for every entry
+exclude_kw_lc = [exclude_keyword.casefold() for exclude_keyword in exclude_keywords]
+required_kw_lc = [req_keyword.casefold() for req_keyword in required_keywords]
+
+# Compile each keyword list once into a single regular expression, so each entry is scanned in a single pass per list
+exclude_pattern = build_pattern(exclude_kw_lc)
+required_pattern = build_pattern(required_kw_lc)
+
+# Always search the whole window: papers can be listed days after their date, so a window narrowed to the days
+# since the previous run would miss them for good. Repeats are skipped through the IDs of the papers already seen instead
+run_started = datetime.now()
+window_start = run_started - timedelta(days=args.days_before_today)
+
+# Entries written by previous runs are skipped, so overlapping windows do not repeat them
+seen_ids = {} if args.include_seen else scitify_cache.load_seen_ids("arxiv")
+retrieval_failed = False
+
+# Entries are written to the output file as soon as they are accepted
+output_file = "../output/latest_arxiv_entries.txt"
+entry_count = 0
+already_sent_count = 0  # Matching entries skipped because a previous run already sent them
+processed_ids = set()  # arXiv identifiers (e.g. '2410.01234v1') of the entries processed so far
+
+# Maximum number of arXiv requests in flight at once, to stay polite with the API
+max_concurrent_requests = 5
+
+# Namespace of the Atom feed returned by the arXiv API
+atom = "{http://www.w3.org/2005/Atom}"
+
+# Parse an arXiv Atom response into a list of entries
+def parse_feed(content):
+    entries = []
+    for entry in etree.fromstring(content).iterfind(f"{atom}entry"):
+        # Skip the error entries the API returns for malformed queries, which carry no publication date
+        published = entry.findtext(f"{atom}published")
+        if published is None:
+            continue
+
+        entries.append({
+            "title": entry.findtext(f"{atom}title", "").strip(),
+            "summary": entry.findtext(f"{atom}summary", "").strip(),
+            "published": published.strip(),
+            "authors": [name.text for name in entry.iterfind(f"{atom}author/{atom}name")],
+            "link": entry.find(f"{atom}link[@rel='alternate']").get("href"),
+        })
+    return entries
+
+# Filter and score the entries of one response page, writing the accepted ones to 'output'
+def process_entries(entries):
+    global entry_count, already_sent_count
+    for entry in entries:
+        # Only print if not in quiet mode
+        if not args.quiet:
+            print(f"Retrieved: {entry['title']}")
+
+        # Avoid processing duplicate entries, keyed by the short arXiv identifier rather than the full URL
+        arxiv_id = entry['link'].rpartition('/abs/')[2]
+        if arxiv_id in processed_ids:
+            continue
+
+        processed_ids.add(arxiv_id)
+
+        # Skip entries already written by a previous run
+        if entry['link'] in seen_ids:
+            already_sent_count += 1
+            continue
+
+        # Convert the published date to match the format and filter by date range
+        published_date = datetime.strptime(entry['published'], '%Y-%m-%dT%H:%M:%SZ')
+        if published_date >= window_start:
+            # Check for exclusion keywords in both title and summary without word boundaries
+            # The NUL separator keeps a keyword from matching across the title and summary
+            combined_text = entry['title'].casefold() + "\x00" + entry['summary'].casefold()
+            if not contains_any(exclude_pattern, combined_text):
+                # Apply a scoring mechanism instead of strict matching
+                score = len(matched_keywords(required_pattern, combined_text))
+                if not required_keywords or score > 0:
+                    # Strip whitespace and replace any newline characters in the title
+                    clean_title = ' '.join(entry['title'].strip().replace('\n', ' ').split())
+                    # Use the URL as a unique identifier for entries to avoid duplicates
+                    entry_data = (
+                        f"Title: {clean_title}\n"
+                        f"Authors: {', '.join(entry['authors'])}\n"
+                        f"Date: {published_date.strftime('%Y-%m-%d')}\n"
+                        f"URL: {entry['link']}\n"
+                        f"Abstract: {entry['summary']}\n\n"
+                    )
+                    output.write(entry_data)
+                    entry_count += 1
+                    seen_ids[entry['link']] = run_started
+                else:
+                    if not args.quiet:
+                        print(f"Excluded (low score): {entry['title']}")
+            else:
+                if not args.quiet:
+                    print(f"Excluded (excluded keyword): {entry['title']}")
+
+# Download one page of results; transient errors (including the 503s arXiv sends when busy) are retried with backoff
+@with_retries(httpx.HTTPError)
+async def _arxiv_page(client, search_url):
+    response = await client.get(search_url)
+    response.raise_for_status()
+    return response.content
+
+# Fetch and parse one page of results for a keyword
+async def fetch_page(client, keyword, offset):
+    encoded_keyword = urllib.parse.quote(keyword)
+    search_url = f"https://export.arxiv.org/api/query?search_query=abs:{encoded_keyword}&start={offset}&max_results={args.batch_size}&sortBy=submittedDate&sortOrder=descending"
+
+    # Pages are not cached: the listing is sorted newest first and its URL holds no date, so a cached page
+    # would hide the papers submitted since it was stored
+    content = await _arxiv_page(client, search_url)
+    return parse_feed(content)
+
+# Page through the results of a single keyword
+async def run_keyword(client, semaphore, keyword):
+    global retrieval_failed
+    offset = 0
     while True:
-        encoded_keyword = urllib.parse.quote(keyword)
-        search_url = f"http://export.arxiv.org/api/query?search_query=abs:{encoded_keyword}&start={offset}&max_results={args.batch_size}&sortBy=submittedDate&sortOrder=descending"
-
-        # Parse the feed
-        response = feedparser.parse(search_url)
+        try:
+            async with semaphore:
+                entries = await fetch_page(client, keyword, offset)
+        except (httpx.HTTPError, etree.XMLSyntaxError) as e:
+            print(f"Error querying arXiv for '{keyword}': {e}")
+            retrieval_failed = True
+            break
 
         # Break if no more entries are returned
-        if not response.entries:
+        if not entries:
             break
 
-        # Iterate through each entry in the response
-        for entry in response.entries:
-            # Only print if not in quiet mode
-            if not args.quiet:
-                print(f"Retrieved: {entry.title}")
+        # Entries are processed synchronously between awaits, so 'output' is never written concurrently
+        process_entries(entries)
 
-            # Avoid processing duplicate entries
-            if entry.link in processed_links:
-                continue
-
-            processed_links.add(entry.link)
-
-            # Convert the published date to match the format and filter by date range
-            published_date = datetime.strptime(entry.published, '%Y-%m-%dT%H:%M:%SZ')
-            if published_date >= datetime.now() - timedelta(days=args.days_before_today):
-                # Check for exclusion keywords in both title and summary without word boundaries
-                combined_text = (entry.title + " " + entry.summary).lower()
-                if not any(exclude_keyword.lower() in combined_text for exclude_keyword in exclude_keywords):
-                    # Apply a scoring mechanism instead of strict matching
-                    score = sum(req_keyword.lower() in combined_text for req_keyword in required_keywords)
-                    if not required_keywords or score > 0:
-                        # Strip whitespace and replace any newline characters in the title
-                        clean_title = ' '.join(entry.title.strip().replace('\n', ' ').split())
-                        # Use the URL as a unique identifier for entries to avoid duplicates
-                        entry_data = (
-                            f"Title: {clean_title}\n"
-                            f"Authors: {', '.join(author.name for author in entry.authors)}\n"
-                            f"Date: {published_date.strftime('%Y-%m-%d')}\n"
-                            f"URL: {entry.link}\n"
-                            f"Abstract: {entry.summary}\n\n"
-                        )
-                        entries[entry.link] = entry_data
-                    else:
-                        if not args.quiet:
-                            print(f"Excluded (low score): {entry.title}")
-                else:
-                    if not args.quiet:
-                        print(f"Excluded (excluded keyword): {entry.title}")
+        # Results are sorted newest first, so stop once a page reaches entries older than the search window
+        if datetime.strptime(entries[-1]['published'], '%Y-%m-%dT%H:%M:%SZ') < window_start:
+            break
 
         # Update offset for the next batch
         offset += args.batch_size
 
-# Write the unique entries to a text file
-if entries:
-    with open("../output/latest_arxiv_entries.txt", "w") as file:
-        file.writelines(entries.values())
-    print(f"{len(entries)} unique entries successfully written to '/Scitify/output/latest_arxiv_entries.txt'.")
-else:
-    print("No matching entries found for the given keywords.")
-
-
-
+# Search all keywords concurrently, multiplexing the requests over one HTTP/2 connection
+async def main():
+    semaphore = asyncio.Semaphore(max_concurrent_requests)
+    async with httpx.AsyncClient(http2=True, timeout=30, headers={"User-Agent": "Scitify/1.0"}) as client:
+        await asyncio.gather(*[run_keyword(client, semaphore, keyword) for keyword in keywords])
 
+# Stream the accepted entries to the output file while searching
+with open(output_file, "w", buffering=1 << 20) as output:
+    asyncio.run(main())
 
+# Report the result, removing the output file again if no entry matched
+if entry_count:
+    print(f"{entry_count} unique entries successfully written to '/Scitify/output/latest_arxiv_entries.txt'.")
+else:
+    os.remove(output_file)
+    if already_sent_count:
+        print(f"No new entries found: the {already_sent_count} matching entries were already sent by a previous run.")
+    else:
+        print("No matching entries found for the given keywords.")
+
+# Record the papers written by a complete run, so that the next one skips them
+if not retrieval_failed:
+    scitify_cache.save_seen_ids("arxiv", seen_ids, run_started - timedelta(days=args.days_before_today))
+
+    # Report a run that only found papers already sent, so that it is not retried
+    if not entry_count and already_sent_count:
+        sys.exit(scitify_cache.nothing_new_status)
@@ -9,62 +9,77 @@
 # Copyright 2024, Cyan Ching, a PhD student at The Physical Chemistry Curie Lab of Institut Curie in France
 # This code is up to date as of October 2024.
 
-import requests
-import json
-import configparser
+import httpx
+import asyncio
+import orjson
 import argparse
 from datetime import datetime, timedelta
+from itertools import accumulate
+from bisect import bisect_right
 import os
+import re
 import sys
-
-def print_header():
-    header = r"""
-     ______                _            
-    \  ___)              | |           
-     \ \__   ___ ___ _  _| |_  _  _  _ 
-      > > \ / / (   ) |/     \| || || |
-     / /_\ v /| || || ( (| |) ) \| |/ |
-    /_____> <  \_)\_)\_)_   _/ \_   _/ 
-         / ^ \           | |     | |   
-        /_/ \_\          |_|     |_|   
-    
-    Welcome to Scitify - Your Custom New Scientific Publication Notifier!
-    
-    Author: Cyan Ching, PhD Student at Institut Curie
-    Version: 1.0 | Date: October 2024
-    
-    """
-    print(header)
+from scitify_banner import print_header
+import scitify_cache
+from scitify_retry import with_retries
 
 if __name__ == "__main__":
     print_header()
 
 # Load keywords from the text file
 def load_keywords_from_file(file_path):
-    config = configparser.ConfigParser(allow_no_value=True)
-    
     if not os.path.exists(file_path):
         return None  # Return None if the file doesn't exist
-    
-    config.read(file_path)
-
-    keywords = {
-        "keywords": [],
-        "exclude_keywords": [],
-        "required_keywords": []
-    }
-
-    if "keywords" in config:
-        keywords["keywords"] = list(config["keywords"].keys())
-
-    if "exclude_keywords" in config:
-        keywords["exclude_keywords"] = list(config["exclude_keywords"].keys())
 
-    if "required_keywords" in config:
-        keywords["required_keywords"] = list(config["required_keywords"].keys())
+    # Read the [section] headers and their entries in one pass, keeping the file order
+    sections = {}
+    current = None
+    with open(file_path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith(("#", ";")):
+                continue
+            if line.startswith("[") and line.endswith("]"):
+                current = sections.setdefault(line[1:-1].strip(), [])
+            elif current is not None:
+                current.append(line.split("=", 1)[0].strip())
+
+    keywords = {key: sections.get(key, []) for key in ("keywords", "exclude_keywords", "required_keywords")}
 
     return keywords
 
+# Compile the (casefolded) keywords into a single regular expression matching any of them, or None if there are no keywords
+def build_pattern(keyword_list):
+    if not keyword_list:
+        return None
+    return re.compile("|".join(map(re.escape, keyword_list)))
+
+# Check whether any keyword of the pattern occurs in the text, stopping at the first match
+def contains_any(pattern, text):
+    return pattern is not None and pattern.search(text) is not None
+
+# Return the distinct keywords of the pattern occurring in the text, in a single scan
+def matched_keywords(pattern, text):
+    if pattern is None:
+        return set()
+    return set(pattern.findall(text))
+
+# Return the indices of the texts containing any keyword of the pattern, scanning the whole batch as one string
+def texts_matching(pattern, texts):
+    if pattern is None:
+        return []
+    # No keyword contains the NUL separator, so a match never spans two texts and its offset identifies the text
+    joined = "\x00".join(texts)
+    starts = list(accumulate((len(text) + 1 for text in texts), initial=0))
+    indices = []
+    match = pattern.search(joined)
+    while match:
+        index = bisect_right(starts, match.start()) - 1
+        indices.append(index)
+        # Resume at the next text, since one match is enough to keep this one
+        match = pattern.search(joined, starts[index + 1])
+    return indices
+
 # Define the command-line arguments and --help flag
 parser = argparse.ArgumentParser(
     description=(
@@ -83,6 +98,7 @@ parser = argparse.ArgumentParser(
 # Define optional arguments
 parser.add_argument('--days_before_today', type=int, help='Number of days before today to search for papers.')
 parser.add_argument('--batch_size', type=int, help='Number of entries to fetch per batch.')
+parser.add_argument('--include_seen', action='store_true', help='Also write the papers already written by a previous run.')
 parser.add_argument('--quiet', action='store_true', help='Suppress output of retrieved and excluded lines.')
 parser.add_argument('--help', action='store_true', help='Show this help message and exit.')
 
@@ -123,83 +139,162 @@ keywords = keywords_dict["keywords"]
 exclude_keywords = keywords_dict["exclude_keywords"]
 required_keywords = keywords_dict["required_keywords"]
 
-start_date = (datetime.now() - timedelta(days=args.days_before_today)).strftime('%Y-%m-%d')
-end_date = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
-
-entries = []
-
-# Iterate over keywords to search separately
-for keyword in keywords:
-    offset = 0  # Reset offset for each keyword
-
-    while True:
-        search_url = f"https://api.biorxiv.org/details/biorxiv/{start_date}/{end_date}/{offset}"
-
-        # Send the search request
-        response = requests.get(search_url)
-        response_data = response.json()
-
-        # Check if data is available
-        if response.status_code == 200 and "collection" in response_data:
-            collection = response_data["collection"]
-            if not collection:
-                break  # No more entries to fetch
-
-            # Iterate through each item in the collection
-            for item in collection:
-                abstract = item.get("abstract", "").lower()
-                combined_text = (item['title'] + " " + item['abstract']).lower()
-
-                # Check if any keyword is present in the abstract
-                if keyword.lower() in abstract:
-                    # Check for exclude keywords
-                    if exclude_keywords and any(exclude_keyword.lower() in combined_text for exclude_keyword in exclude_keywords):
-                        if not args.quiet:
-                            print(f"Excluded (excluded keyword): {item['title']}")
-                        continue
-
-                    # Check for required keywords
-                    if required_keywords:
-                        score = sum(req_keyword.lower() in combined_text for req_keyword in required_keywords)
-                        if score == 0:
-                            if not args.quiet:
-                                print(f"Excluded (missing required keyword): {item['title']}")
-                            continue
-
-                    # Properly handle the authors list
-                    authors_list = item.get('authors', [])
-                    if isinstance(authors_list, list):
-                        authors = ', '.join(authors_list)
-                    else:
-                        authors = authors_list  # Fallback if it's not a list
-
-                    # Create the entry
-                    entry = (
-                        f"Title: {item['title']}\n"
-                        f"Authors: {authors}\n"
-                        f"Date: {item['date']}\n"
-                        f"URL: https://doi.org/{item['doi']}\n"
-                        f"Abstract: {item['abstract']}\n\n"
-                    )
-                    entries.append(entry)
-
-                    # Only print if not in quiet mode
-                    if not args.quiet:
-                        print(f"Retrieved: {item['title']}")
-
-            # Update the offset to get the next batch
-            offset += args.batch_size
+# Casefold the keywords once instead of for every entry
+keywords_lc = [keyword.casefold() for keyword in keywords]
+exclude_kw_lc = [exclude_keyword.casefold() for exclude_keyword in exclude_keywords]
+required_kw_lc = [req_keyword.casefold() for req_keyword in required_keywords]
+
+# Compile each keyword list once into a single regular expression, so each entry is scanned in a single pass per list
+exclude_pattern = build_pattern(exclude_kw_lc)
+required_pattern = build_pattern(required_kw_lc)
+keyword_pattern = build_pattern(keywords_lc)
+
+# Always search the whole window: papers can be listed days after their date, so a window narrowed to the days
+# since the previous run would miss them for good. Repeats are skipped through the IDs of the papers already seen instead
+run_started = datetime.now()
+window_start = run_started - timedelta(days=args.days_before_today)
+
+start_date = window_start.strftime('%Y-%m-%d')
+end_date = (run_started - timedelta(days=1)).strftime('%Y-%m-%d')
+
+# Entries written by previous runs are skipped, so overlapping windows do not repeat them
+seen_ids = {} if args.include_seen else scitify_cache.load_seen_ids("biorxiv")
+retrieval_failed = False
+
+# Maximum number of simultaneous connections to the bioRxiv API
+max_connections = 8
+
+# Download one page of the bioRxiv details API; transient errors are retried with backoff
+@with_retries(httpx.HTTPError)
+async def _biorxiv_page(client, search_url):
+    response = await client.get(search_url)
+    response.raise_for_status()
+    return response.content
+
+# Fetch one page of the bioRxiv details API, returning None if the request fails
+async def fetch_page(client, offset):
+    global retrieval_failed
+    search_url = f"https://api.biorxiv.org/details/biorxiv/{start_date}/{end_date}/{offset}"
+
+    # Reuse a recent response for the same page if one is cached
+    content = scitify_cache.get_cached(search_url)
+    if content is not None:
+        return orjson.loads(content)
+
+    try:
+        content = await _biorxiv_page(client, search_url)
+        response_data = orjson.loads(content)
+
+        # Only cache pages with papers, so that an empty or failed response is retried on the next run
+        if response_data.get("collection"):
+            scitify_cache.store(search_url, content)
+        return response_data
+    except (httpx.HTTPError, ValueError):
+        print("Failed to retrieve data from bioRxiv. Please try again later.")
+        retrieval_failed = True
+        return None
+
+# Fetch every page of the date window exactly once, since the API does not depend on the keywords
+async def fetch_all_pages():
+    # Nothing to fetch if the window holds no complete day
+    if start_date > end_date:
+        return []
+
+    # Keep the connections alive across pages, ask for gzip-compressed JSON, and retry failed connection attempts
+    limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+    transport = httpx.AsyncHTTPTransport(http2=True, limits=limits, retries=5)
+    headers = {"Accept-Encoding": "gzip", "User-Agent": "Scitify/1.0"}
+    async with httpx.AsyncClient(transport=transport, headers=headers, timeout=30) as client:
+        first_page = await fetch_page(client, 0)
+        if not first_page or not first_page.get("collection"):
+            return []
+
+        # The first page reports the total number of papers, so the remaining pages can be fetched concurrently
+        total = int(first_page["messages"][0]["total"])
+        offsets = range(args.batch_size, total, args.batch_size)
+        pages = [first_page] + await asyncio.gather(*[fetch_page(client, offset) for offset in offsets])
+
+    items = []
+    for page in pages:
+        if page and "collection" in page:
+            items.extend(page["collection"])
+    return items
+
+items = asyncio.run(fetch_all_pages())
+
+# Entries are written to the output file as soon as they are accepted
+output_file = "../output/latest_bioRxiv_entries.txt"
+entry_count = 0
+already_sent_count = 0  # Matching papers skipped because a previous run already sent them
+
+# Keep only the papers whose abstract contains a keyword, found with a single scan over all abstracts
+abstracts = [item.get("abstract", "").casefold() for item in items]
+candidates = texts_matching(keyword_pattern, abstracts)
+
+# Filter the remaining papers against the exclude and required keywords locally
+with open(output_file, "w", buffering=1 << 20) as output:
+    for index in candidates:
+        item = items[index]
+
+        # Skip papers already written by a previous run
+        if item['doi'] in seen_ids:
+            already_sent_count += 1
+            continue
+
+        # Reuse the casefolded abstract; the NUL separator keeps a keyword from matching across the title and abstract
+        combined_text = item['title'].casefold() + "\x00" + abstracts[index]
+
+        # Check for exclude keywords
+        if contains_any(exclude_pattern, combined_text):
+            if not args.quiet:
+                print(f"Excluded (excluded keyword): {item['title']}")
+            continue
+
+        # Check for required keywords
+        if required_keywords:
+            score = len(matched_keywords(required_pattern, combined_text))
+            if score == 0:
+                if not args.quiet:
+                    print(f"Excluded (missing required keyword): {item['title']}")
+                continue
+
+        # Properly handle the authors list
+        authors_list = item.get('authors', [])
+        if isinstance(authors_list, list):
+            authors = ', '.join(authors_list)
         else:
-            print("Failed to retrieve data from bioRxiv. Please try again later.")
-            break
-
-# Write the entries to a text file
-if entries:
-    with open("../output/latest_bioRxiv_entries.txt", "w") as file:
-        file.writelines(entries)
-    print(f"{len(entries)} entries successfully written to '/Scitify/output/latest_bioRxiv_entries.txt'.")
+            authors = authors_list  # Fallback if it's not a list
+
+        # Create the entry
+        entry = (
+            f"Title: {item['title']}\n"
+            f"Authors: {authors}\n"
+            f"Date: {item['date']}\n"
+            f"URL: https://doi.org/{item['doi']}\n"
+            f"Abstract: {item['abstract']}\n\n"
+        )
+        output.write(entry)
+        entry_count += 1
+        seen_ids[item['doi']] = run_started
+
+        # Only print if not in quiet mode
+        if not args.quiet:
+            print(f"Retrieved: {item['title']}")
+
+# Report the result, removing the output file again if no entry matched
+if entry_count:
+    print(f"{entry_count} entries successfully written to '/Scitify/output/latest_bioRxiv_entries.txt'.")
 else:
-    print("No matching entries found for the given keywords.")
-
-
-
+    os.remove(output_file)
+    if already_sent_count:
+        print(f"No new entries found: the {already_sent_count} matching entries were already sent by a previous run.")
+    else:
+        print("No matching entries found for the given keywords.")
+
+# Record the papers written by a complete run, so that the next one skips them
+if not retrieval_failed:
+    scitify_cache.save_seen_ids("biorxiv", seen_ids, run_started - timedelta(days=args.days_before_today))
+
+    # Report a run that only found papers already sent, so that it is not retried
+    if not entry_count and already_sent_count:
+        sys.exit(scitify_cache.nothing_new_status)
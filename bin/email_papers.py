@@ -4,6 +4,7 @@
 # Usage examples:
 #   python3 email_papers.py --service gmail_service --receiver_email your_email
 #   python3 email_papers.py --service outlook_service --receiver_email your_email
+#   python3 email_papers.py --service gmail_service --receiver_email first_email,second_email --batch
 #
 # Note: Ensure you have already set up your email credentials using 'email_setup.py'.
 #
@@ -11,46 +12,31 @@
 # This code is up to date as of October 2024.
 
 import argparse
-import keyring
-import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.mime.base import MIMEBase
-from email import encoders
+import json
+from concurrent.futures import ThreadPoolExecutor
+import base64
+import mmap
+import re
 import os
 import sys
-
-def print_header():
-    header = r"""
-     ______                _            
-    \  ___)              | |           
-     \ \__   ___ ___ _  _| |_  _  _  _ 
-      > > \ / / (   ) |/     \| || || |
-     / /_\ v /| || || ( (| |) ) \| |/ |
-    /_____> <  \_)\_)\_)_   _/ \_   _/ 
-         / ^ \           | |     | |   
-        /_/ \_\          |_|     |_|   
-    
-    Welcome to Scitify - Your Custom New Scientific Publication Notifier!
-    
-    Author: Cyan Ching, PhD Student at Institut Curie
-    Version: 1.0 | Date: October 2024
-    
-    """
-    print(header)
+from scitify_banner import print_header
+from scitify_sources import source_name, no_entries_message
 
 if __name__ == "__main__":
     print_header()
 
 # Helper function to display the help message in the desired format
 def print_help():
-    help_message = """usage: email_papers.py [--help] --service {outlook_service,gmail_service} --receiver_email RECEIVER_EMAIL
+    help_message = """usage: email_papers.py [--help] --service {outlook_service,gmail_service} --receiver_email RECEIVER_EMAIL [--batch]
 
 This function of Scitify is used to securely send the '/Scitify/output/titles_and_urls.txt' file content as the main body of the email and attach the '/Scitify/output/latest_arxiv_entries.txt', '/Scitify/output/latest_bioRxiv_entries.txt', and '/Scitify/output/latest_pubmed_entries.txt' files (if they exist).
 
 Example usages:
   python3 email_papers.py --service gmail_service --receiver_email your_email
   python3 email_papers.py --service outlook_service --receiver_email your_email
+  python3 email_papers.py --service gmail_service --receiver_email first_email,second_email --batch
+
+With --batch, each address in the comma-separated --receiver_email list receives its own email, sent over a single SMTP connection.
 
 Note: Ensure you have already set up your email credentials using 'email_setup.py'.
 
@@ -60,6 +46,35 @@ Date: October 2024
     print(help_message)
     sys.exit()
 
+# Read a whole file through a read-only memory map, avoiding the copy through the file object's buffer
+def read_mapped(file_path):
+    with open(file_path, "rb") as f:
+        # An empty file cannot be memory-mapped
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return mapped[:]
+
+# Bytes of the file encoded at a time; a multiple of 57, so that every block encodes to whole 76-character lines (RFC 2045)
+encode_block_size = 57 * 1024
+
+# Base64-encode a memory-mapped file block by block into a buffer sized up front for the encoded output,
+# so that the file itself is never copied whole
+def encode_attachment(file_path):
+    with open(file_path, "rb") as src:
+        size = os.fstat(src.fileno()).st_size
+        # 4 characters for every 3 bytes, plus a newline after every 76-character line (57 bytes of input)
+        encoded = bytearray((size + 2) // 3 * 4 + (size + 56) // 57)
+        # An empty file cannot be memory-mapped, and encodes to nothing
+        if size:
+            with mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                position = 0
+                for start in range(0, size, encode_block_size):
+                    block = base64.encodebytes(mapped[start:start + encode_block_size])
+                    encoded[position:position + len(block)] = block
+                    position += len(block)
+    return encoded
+
 # Initialize argument parser without default help
 parser = argparse.ArgumentParser(add_help=False)
 
@@ -68,6 +83,7 @@ parser.add_argument('--help', action='store_true', help="Show this help message
 parser.add_argument('--service', required=False, choices=['outlook_service', 'gmail_service'],
                     help="Specify the email service to use: either 'outlook_service' or 'gmail_service'.")
 parser.add_argument('--receiver_email', required=False, help="The email address to receive the updates.")
+parser.add_argument('--batch', action='store_true', help="Treat --receiver_email as a comma-separated list and email each address over one connection.")
 
 # Parse arguments
 args = parser.parse_args()
@@ -87,80 +103,176 @@ if not os.path.exists(main_file):
     print(f"Error: '{main_file}' does not exist. Please generate it before sending the email.")
     sys.exit(1)
 
-# Retrieve email credentials from keyring
-sender_email = keyring.get_password(args.service, "email_username")
-password = keyring.get_password(args.service, "email_password")
+# Read the content of 'titles_and_urls.txt'
+email_body = read_mapped(main_file).decode()
+
+# Nothing to send if the summary only says that no entries were found, so skip connecting to the SMTP server
+if email_body == no_entries_message:
+    print("No new entries to send, skipping the email.")
+    sys.exit(0)
+
+# Import the heavy modules only now, so that --help and argument errors do not wait for them to load
+import keyring
+import smtplib
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.mime.base import MIMEBase
+import email.policy
+
+# Retrieve email credentials from keyring, stored together as one JSON entry so that a single lookup is needed
+credentials = keyring.get_password(args.service, "all")
+if credentials:
+    credentials = json.loads(credentials)
+    sender_email = credentials.get("email_username")
+    password = credentials.get("email_password")
+else:
+    # Fall back to the separate entries stored by earlier versions of 'email_setup.py'
+    sender_email = keyring.get_password(args.service, "email_username")
+    password = keyring.get_password(args.service, "email_password")
 
 if not sender_email or not password:
     print(f"Failed to retrieve credentials for {args.service}. Please set them using 'email_setup.py'.")
     sys.exit(1)
 
-receiver_email = args.receiver_email
-
-# Read the content of 'titles_and_urls.txt'
-with open(main_file, 'r') as f:
-    email_body = f.read()
-
-# Setup the MIME (create the 'message' object before attachments)
-message = MIMEMultipart()
-message['From'] = sender_email
-message['To'] = receiver_email
-message['Subject'] = "Titles and URLs from the Latest Articles"
+# With --batch, --receiver_email is a comma-separated list and each address receives its own copy of the email
+if args.batch:
+    receivers = [address.strip() for address in args.receiver_email.split(",") if address.strip()]
+else:
+    receivers = [args.receiver_email]
 
-# Attach any of the latest_arxiv_entries.txt, latest_bioRxiv_entries.txt, and latest_pubmed_entries.txt if they exist
+# Encode any of the latest_arxiv_entries.txt, latest_bioRxiv_entries.txt, and latest_pubmed_entries.txt if they exist,
+# once for all receivers
 attachment_files = ["../output/latest_arxiv_entries.txt", "../output/latest_bioRxiv_entries.txt", "../output/latest_pubmed_entries.txt"]
 
-missing_files = []
-for attachment_file in attachment_files:
-    if os.path.exists(attachment_file):
+# Build the MIME part of one attachment file
+def prepare_attachment(attachment_file):
+    part = MIMEBase('application', 'octet-stream')
+    # The email package keeps payloads as text, so the encoded buffer is decoded once into the ASCII payload
+    part.set_payload(encode_attachment(attachment_file).decode('ascii'))
+    part.add_header('Content-Transfer-Encoding', 'base64')
+    part.add_header('Content-Disposition', f"attachment; filename={os.path.basename(attachment_file)}")
+    return part
+
+existing_files = [attachment_file for attachment_file in attachment_files if os.path.exists(attachment_file)]
+missing_files = [attachment_file for attachment_file in attachment_files if attachment_file not in existing_files]
+
+# Read and encode the attachments in parallel, so that waiting on one file's disk reads overlaps with the others
+attachment_parts = []
+if existing_files:
+    with ThreadPoolExecutor(max_workers=len(existing_files)) as executor:
+        futures = [executor.submit(prepare_attachment, attachment_file) for attachment_file in existing_files]
+    for attachment_file, future in zip(existing_files, futures):
         try:
-            with open(attachment_file, "rb") as attachment:
-                part = MIMEBase('application', 'octet-stream')
-                part.set_payload(attachment.read())
-            encoders.encode_base64(part)
-            part.add_header('Content-Disposition', f"attachment; filename={os.path.basename(attachment_file)}")
-            message.attach(part)
+            attachment_parts.append(future.result())
             print(f"Attached: {attachment_file}")
         except Exception as e:
             print(f"Failed to attach {attachment_file}: {e}")
-    else:
-        missing_files.append(attachment_file)
 
 # If any files are missing, add a message that no entries were found from arXiv, bioRxiv, or PubMed
 if missing_files:
-    missing_sources = []
-    for file in missing_files:
-        if "arxiv" in file.lower():
-            missing_sources.append("arXiv")
-        elif "biorxiv" in file.lower():
-            missing_sources.append("bioRxiv")
-        elif "pubmed" in file.lower():
-            missing_sources.append("PubMed")
-    
-    missing_sources_info = "\n".join([f"No entries found from {source}." for source in missing_sources])
+    missing_sources_info = "\n".join(f"No entries found from {source_name(file)}." for file in missing_files)
     email_body += f"\n\n{missing_sources_info}"
 
-# Attach the updated email body
-message.attach(MIMEText(email_body, 'plain'))
+# Setup the MIME message for one receiver, with the attachments followed by the email body
+def build_message(receiver_email):
+    # The SMTP policy writes CRLF line endings directly, as sent on the wire
+    message = MIMEMultipart(policy=email.policy.SMTP)
+    message['From'] = sender_email
+    message['To'] = receiver_email
+    message['Subject'] = "Titles and URLs from the Latest Articles"
+    for part in attachment_parts:
+        message.attach(part)
+    message.attach(MIMEText(email_body, 'plain'))
+    return message
 
 # SMTP server setup
 smtp_server = "smtp.office365.com" if args.service == "outlook_service" else "smtp.gmail.com"
 smtp_port = 587
 
-# Connect to the SMTP server and send the email
+# Number of emails sent before the SMTP session is closed and opened again, since servers limit messages per connection
+max_sends_per_connection = 10000
+
+# Open a secure, authenticated SMTP session
+def connect():
+    server = smtplib.SMTP(smtp_server, smtp_port, timeout=30)
+    server.starttls()  # Secure the connection
+    server.ehlo()  # Ask again for the server extensions (such as PIPELINING), which are only reliable after STARTTLS
+    server.login(sender_email, password)
+    return server
+
+# Send one message over an open SMTP session
+def send(server, message):
+    if not server.has_extn('pipelining'):
+        server.send_message(message)
+        return
+
+    # Pipeline MAIL FROM, RCPT TO, and DATA (RFC 2920), so the envelope costs one round trip instead of three
+    server.putcmd("mail", f"FROM:{smtplib.quoteaddr(sender_email)}")
+    server.putcmd("rcpt", f"TO:{smtplib.quoteaddr(message['To'])}")
+    server.putcmd("data")
+    mail_code, mail_response = server.getreply()
+    rcpt_code, rcpt_response = server.getreply()
+    data_code, data_response = server.getreply()
+
+    # A server may still accept DATA after refusing the sender or receiver, so end the empty message before failing
+    if data_code == 354 and (mail_code != 250 or rcpt_code not in (250, 251)):
+        server.send(".\r\n")
+        server.getreply()
+    if mail_code != 250:
+        server.rset()
+        raise smtplib.SMTPSenderRefused(mail_code, mail_response, sender_email)
+    if rcpt_code not in (250, 251):
+        server.rset()
+        raise smtplib.SMTPRecipientsRefused({message['To']: (rcpt_code, rcpt_response)})
+    if data_code != 354:
+        server.rset()
+        raise smtplib.SMTPDataError(data_code, data_response)
+
+    # Send the message as bytes with leading periods doubled, followed by the terminating period
+    content = re.sub(rb"(?m)^\.", b"..", message.as_bytes())
+    if not content.endswith(b"\r\n"):
+        content += b"\r\n"
+    server.send(content + b".\r\n")
+    code, response = server.getreply()
+    if code != 250:
+        server.rset()
+        raise smtplib.SMTPDataError(code, response)
+
+# Send the email to every receiver over a single SMTP session, reconnecting if the server drops it
+# Returns the number of receivers the email could not be sent to
+def send_digest(receivers):
+    failed = 0
+    server = connect()
+    try:
+        for count, receiver_email in enumerate(receivers, start=1):
+            message = build_message(receiver_email)
+            try:
+                send(server, message)
+            except smtplib.SMTPServerDisconnected:
+                # The server closed the session (e.g. after an idle timeout), so reconnect once and resend
+                server = connect()
+                send(server, message)
+            except smtplib.SMTPRecipientsRefused as e:
+                print(f"Failed to send email to {receiver_email}: {e}")
+                failed += 1
+                continue
+            print(f"Email successfully sent to {receiver_email}.")
+
+            # Recycle the session after many emails
+            if count % max_sends_per_connection == 0 and count < len(receivers):
+                server.quit()
+                server = connect()
+    finally:
+        try:
+            server.quit()
+        except smtplib.SMTPServerDisconnected:
+            pass
+    return failed
+
+# Connect to the SMTP server and send the email, exiting with an error status if it did not reach every receiver
 try:
-    with smtplib.SMTP(smtp_server, smtp_port) as server:
-        server.starttls()  # Secure the connection
-        server.login(sender_email, password)
-        server.sendmail(sender_email, receiver_email, message.as_string())
-    print(f"Email successfully sent to {receiver_email}.")
+    if send_digest(receivers):
+        sys.exit(1)
 except Exception as e:
     print(f"Failed to send email: {e}")
-
-
-
-
-
-
-
-
+    sys.exit(1)
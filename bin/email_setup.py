@@ -9,30 +9,12 @@
 # Copyright (C) 2024 Cyan Ching, PhD student at The Physical Chemistry Curie Lab of Institut Curie in France.
 # This code is up to date as of October 2024.
 
-import keyring
+import json
 import argparse
 import sys
+from scitify_banner import print_header
 import getpass
 
-def print_header():
-    header = r"""
-     ______                _            
-    \  ___)              | |           
-     \ \__   ___ ___ _  _| |_  _  _  _ 
-      > > \ / / (   ) |/     \| || || |
-     / /_\ v /| || || ( (| |) ) \| |/ |
-    /_____> <  \_)\_)\_)_   _/ \_   _/ 
-         / ^ \           | |     | |   
-        /_/ \_\          |_|     |_|   
-    
-    Welcome to Scitify - Your Custom New Scientific Publication Notifier!
-    
-    Author: Cyan Ching, PhD Student at Institut Curie
-    Version: 1.0 | Date: October 2024
-    
-    """
-    print(header)
-
 if __name__ == "__main__":
     print_header()
 
@@ -80,11 +62,13 @@ args = parser.parse_args()
 # Check if any flags are missing
 check_missing_flags(args)
 
+# Import the heavy modules only now, so that --help and argument errors do not wait for them to load
+import keyring
+
 # Prompt the user for their password securely using getpass
 password = getpass.getpass("Enter your email password (input will be hidden): ")
 
-# Store the email address and password securely in the keyring
-keyring.set_password(args.service, "email_username", args.email)
-keyring.set_password(args.service, "email_password", password)
+# Store the email address and password securely in the keyring, together as one JSON entry so they are read in a single lookup
+keyring.set_password(args.service, "all", json.dumps({"email_username": args.email, "email_password": password}))
 
 print("Credentials have been securely stored in the keyring.")
@@ -113,6 +113,7 @@ do
         days_PubMed) days_PubMed="$value" ;;
         batch_PubMed) batch_PubMed="$value" ;;
         email_PubMed) email_PubMed="$value" ;;
+        api_key_PubMed) api_key_PubMed="$value" ;;
         
         send_email) send_email="$value" ;;
         service) service="$value" ;;
@@ -195,18 +196,25 @@ fi
 # Define the retry count for arXiv_retrieve.py (default to 3 if not specified)
 retry_count=${1:-3}
 
+# Drop the seen paper IDs left pending by an earlier run whose delivery failed, so only this run's retrievals are promoted below
+rm -f ../cache/*_seen_ids.pending.pickle
+
 # Run arXiv_retrieve.py if arXiv inclusion is enabled
 if [ -n "$include_arXiv" ] && [ "$include_arXiv" -eq 1 ]; then
     for ((i=1; i<=$retry_count; i++))
     do
         echo "Attempt $i to retrieve publications from arXiv (running arXiv_retrieve.py)"
         python3 arXiv_retrieve.py --days_before_today $days_arXiv --batch_size $batch_arXiv --quiet 2>&1 | clean_output
-        arxiv_status=$?
+        arxiv_status=${PIPESTATUS[0]}
         
         # Check if the output file exists and is not empty
         if [ -s "../output/latest_arxiv_entries.txt" ]; then
             echo "Retrieval from arXiv succeeded on attempt $i"
             break
+        elif [ $arxiv_status -eq 3 ]; then
+            # Exit status 3: every matching entry was already sent by a previous run, so retrying would find nothing new
+            echo "No new entries from arXiv since the previous run"
+            break
         else
             echo "No entries returned from arXiv, retrying..."
         fi
@@ -223,12 +231,16 @@ if [ -n "$include_bioRxiv" ] && [ "$include_bioRxiv" -eq 1 ]; then
     for ((i=1; i<=$retry_count; i++)); do
         echo "Attempt $i to retrieve publications from bioRxiv (running bioRxiv_retrieve.py)"
         python3 bioRxiv_retrieve.py --days_before_today $days_bioRxiv --batch_size $batch_bioRxiv --quiet 2>&1 | clean_output
-        bioRxiv_status=$?
+        bioRxiv_status=${PIPESTATUS[0]}
 
         # Check if the output file exists and is not empty
         if [ -s "../output/latest_bioRxiv_entries.txt" ]; then
             echo "Retrieval from bioRxiv succeeded on attempt $i"
             break
+        elif [ $bioRxiv_status -eq 3 ]; then
+            # Exit status 3: every matching entry was already sent by a previous run, so retrying would find nothing new
+            echo "No new entries from bioRxiv since the previous run"
+            break
         else
             echo "No entries returned from bioRxiv, retrying..."
         fi
@@ -244,13 +256,17 @@ fi
 if [ -n "$include_PubMed" ] && [ "$include_PubMed" -eq 1 ]; then
     for ((i=1; i<=$retry_count; i++)); do
         echo "Attempt $i to retrieve publications from PubMed (running PubMed_retrieve.py)"
-        python3 PubMed_retrieve.py --days_before_today $days_PubMed --batch_size $batch_PubMed --email $email_PubMed --quiet 2>&1 | clean_output
-        PubMed_status=$?
+        python3 PubMed_retrieve.py --days_before_today $days_PubMed --batch_size $batch_PubMed --email $email_PubMed ${api_key_PubMed:+--api_key $api_key_PubMed} --quiet 2>&1 | clean_output
+        PubMed_status=${PIPESTATUS[0]}
 
         # Check if the output file exists and is not empty
         if [ -s "../output/latest_pubmed_entries.txt" ]; then
             echo "Retrieval from PubMed succeeded on attempt $i"
             break
+        elif [ $PubMed_status -eq 3 ]; then
+            # Exit status 3: every matching entry was already sent by a previous run, so retrying would find nothing new
+            echo "No new entries from PubMed since the previous run"
+            break
         else
             echo "No entries returned from PubMed, retrying..."
         fi
@@ -267,7 +283,7 @@ fi
 echo
 echo "Summarising retrieved publications (running summarise_papers.py)..."
 python3 summarise_papers.py 2>&1 | clean_output
-summarise_status=$?
+summarise_status=${PIPESTATUS[0]}
 if [ $summarise_status -ne 0 ]; then
     echo "Summarisation of retrieved publications failed with the following error:"
     echo "$summarise_status"
@@ -283,7 +299,7 @@ if [ "$send_email" -eq 1 ]; then
     echo
     echo "Preparing to send the summary of retrieved publications to your specified email address (running email_papers.py)..."
     python3 email_papers.py --service $service --receiver_email $receiver_email 2>&1 | clean_output
-    email_papers_status=$?
+    email_papers_status=${PIPESTATUS[0]}
     if [ $email_papers_status -ne 0 ]; then
         echo "Email sending failed with the following error:"
         echo "$email_papers_status"
@@ -298,7 +314,7 @@ if [ "$post_tweet" -eq 1 ]; then
     echo
     echo "Preparing to send the summary of retrieved publications to your specified Twitter account (running twitter_papers.py)..."
     python3 twitter_papers.py --credentials_key $twitter_credentials 2>&1 | clean_output
-    twitter_papers_status=$?
+    twitter_papers_status=${PIPESTATUS[0]}
     if [ $twitter_papers_status -ne 0 ]; then
         echo "Posting on Twitter failed with the following error:"
         echo "$twitter_papers_status"
@@ -310,6 +326,19 @@ fi
 
 # ----------------------------------------------------------------------------------------
 
+# Mark the retrieved papers as seen only once the summary was written and the papers were delivered, so that papers
+# whose delivery failed are retrieved and sent again by the next run. A sent email delivers the whole digest, so a failed
+# tweet does not hold it back; without email, every tweet must be posted (those posted by an earlier run count as posted)
+if [ $summarise_status -eq 0 ] && { [ "$email_status" = "success" ] || { [ "$email_status" = "not run" ] && [ "$tweet_status" != "failed" ]; }; }; then
+    for pending in ../cache/*_seen_ids.pending.pickle; do
+        if [ -f "$pending" ]; then
+            mv "$pending" "${pending%.pending.pickle}.pickle"
+        fi
+    done
+fi
+
+# ----------------------------------------------------------------------------------------
+
 # Report final status
 echo
 echo "Summary of operations:"
@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+
+# This helper of Scitify holds the welcome banner shown when a Scitify script is run from a terminal.
+# It is imported by all Scitify Python scripts and is not meant to be run on its own.
+
+# Copyright (C) 2024 Cyan Ching, PhD student at The Physical Chemistry Curie Lab of Institut Curie in France.
+# This code is up to date as of October 2024.
+
+import sys
+
+header = r"""
+     ______                _            
+    \  ___)              | |           
+     \ \__   ___ ___ _  _| |_  _  _  _ 
+      > > \ / / (   ) |/     \| || || |
+     / /_\ v /| || || ( (| |) ) \| |/ |
+    /_____> <  \_)\_)\_)_   _/ \_   _/ 
+         / ^ \           | |     | |   
+        /_/ \_\          |_|     |_|   
+    
+    Welcome to Scitify - Your Custom New Scientific Publication Notifier!
+    
+    Author: Cyan Ching, PhD Student at Institut Curie
+    Version: 1.0 | Date: October 2024
+    
+    """
+
+# Print the banner only in an interactive terminal, so scheduled runs and piped output skip it
+def print_header():
+    if sys.stdout.isatty():
+        sys.stdout.write(header + "\n")
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+
+# This helper of Scitify keeps a persistent on-disk cache of API responses in '/Scitify/cache/scitify_cache.sqlite',
+# so that repeated runs over the same date window do not download the same pages again.
+# Only bioRxiv and PubMed responses are cached, as their queries are bounded by dates; arXiv's newest-first listing is not.
+# It also remembers which entries were already delivered for each source, so that scheduled runs do not repeat them.
+# It is imported by arXiv_retrieve.py, bioRxiv_retrieve.py, and PubMed_retrieve.py and is not meant to be run on its own.
+
+# Copyright (C) 2024 Cyan Ching, PhD student at The Physical Chemistry Curie Lab of Institut Curie in France.
+# This code is up to date as of October 2024.
+
+from contextlib import closing
+import sqlite3
+import pickle
+import time
+import os
+
+# Cache database file, relative to '/Scitify/bin' like the other Scitify paths
+cache_file = "../cache/scitify_cache.sqlite"
+
+# File keeping the IDs of the entries already delivered for a source
+seen_ids_file = "../cache/{source}_seen_ids.pickle"
+
+# File the IDs of a retrieval are saved to until its entries have been delivered,
+# at which point run_paper_update.sh renames it to 'seen_ids_file'
+pending_seen_ids_file = "../cache/{source}_seen_ids.pending.pickle"
+
+# Exit status of a complete retrieval whose matching entries were all sent by earlier runs,
+# so that run_paper_update.sh can tell it from a retrieval that returned nothing and does not retry it
+nothing_new_status = 3
+
+# Number of seconds after which a cached response is considered stale (24 hours)
+expire_after = 86400
+
+# Open the cache database, creating it on first use
+def connect():
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    connection = sqlite3.connect(cache_file, timeout=30)
+    connection.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, content BLOB, created REAL)")
+    return connection
+
+# Return the cached content stored under a key, or None if it is missing or stale
+def get_cached(key):
+    with closing(connect()) as connection:
+        row = connection.execute("SELECT content, created FROM responses WHERE key = ?", (key,)).fetchone()
+
+    if row is None or time.time() - row[1] > expire_after:
+        return None
+    return row[0]
+
+# Store the content of a response under a key, dropping stale responses on the way
+def store(key, content):
+    now = time.time()
+    with closing(connect()) as connection, connection:
+        connection.execute("DELETE FROM responses WHERE created < ?", (now - expire_after,))
+        connection.execute("INSERT OR REPLACE INTO responses (key, content, created) VALUES (?, ?, ?)", (key, content, now))
+
+# Return the IDs of the entries already delivered for a source, mapped to the time they were first written
+def load_seen_ids(source):
+    try:
+        with open(seen_ids_file.format(source=source), "rb") as f:
+            return pickle.load(f)
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+        return {}
+
+# Save the IDs of the entries written for a source as pending, forgetting those written before 'oldest'
+# They only count as delivered once run_paper_update.sh has sent the papers and promoted the pending file
+def save_seen_ids(source, seen_ids, oldest):
+    recent_ids = {entry_id: seen for entry_id, seen in seen_ids.items() if seen >= oldest}
+    os.makedirs(os.path.dirname(pending_seen_ids_file), exist_ok=True)
+    with open(pending_seen_ids_file.format(source=source), "wb") as f:
+        pickle.dump(recent_ids, f)
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+
+# This helper of Scitify retries transient API failures (connection errors, HTTP 429 and 5xx responses)
+# with exponential backoff, so that one failed page does not end a whole retrieval run.
+# A 429 "Too Many Requests" response is retried after the delay given in its Retry-After header, if any.
+# It is imported by arXiv_retrieve.py, bioRxiv_retrieve.py, and PubMed_retrieve.py and is not meant to be run on its own.
+
+# Copyright (C) 2024 Cyan Ching, PhD student at The Physical Chemistry Curie Lab of Institut Curie in France.
+# This code is up to date as of October 2024.
+
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential
+
+# Number of attempts per request, including the first one
+max_attempts = 5
+
+# Wait 1, 2, 4, ... seconds between attempts, capped at 30 seconds
+backoff = wait_exponential(multiplier=1, max=30)
+
+# Longest Retry-After delay that is honoured, so that a misbehaving server cannot stall a run
+max_retry_after = 120
+
+# Return the HTTP status code and headers of an error, for both urllib (Entrez) and httpx exceptions
+def error_response(error):
+    response = getattr(error, "response", None)
+    if response is not None:
+        return response.status_code, response.headers
+    return getattr(error, "code", None), getattr(error, "headers", None) or {}
+
+# Wait for the server's Retry-After delay on a 429 response, or back off exponentially otherwise
+def wait_retry_after(retry_state):
+    status, headers = error_response(retry_state.outcome.exception())
+    retry_after = headers.get("Retry-After", "").strip()
+    if status == 429 and retry_after.isdigit():
+        return min(int(retry_after), max_retry_after)
+    return backoff(retry_state)
+
+# Decorate a function (or coroutine) to retry it on the given exception types, unless the error is a
+# client-side HTTP error other than 429; the last exception is re-raised once all attempts fail
+def with_retries(*exception_types):
+    def is_transient(error):
+        if not isinstance(error, exception_types):
+            return False
+        status, _ = error_response(error)
+        return not isinstance(status, int) or status == 429 or status >= 500
+
+    return retry(stop=stop_after_attempt(max_attempts), wait=wait_retry_after, retry=retry_if_exception(is_transient), reraise=True)
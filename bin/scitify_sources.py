@@ -0,0 +1,21 @@
+#!/usr/bin/env python3
+
+# This helper of Scitify maps the entry files written by the retrieval scripts ('/Scitify/output/latest_<source>_entries.txt')
+# to the display names of their sources.
+# It also holds the text written to '/Scitify/output/titles_and_urls.txt' when no source returned entries.
+# It is imported by summarise_papers.py, email_papers.py, and twitter_papers.py and is not meant to be run on its own.
+
+# Copyright (C) 2024 Cyan Ching, PhD student at The Physical Chemistry Curie Lab of Institut Curie in France.
+# This code is up to date as of October 2024.
+
+import os
+
+# Display name of each source, keyed by the lowercased source token of its entry file name
+source_names = {"arxiv": "arXiv", "biorxiv": "bioRxiv", "pubmed": "PubMed"}
+
+# Content of 'titles_and_urls.txt' when there are no entries to send or tweet
+no_entries_message = "No entries found for the given sources.\n"
+
+# Return the display name of the source an entry file belongs to, e.g. 'bioRxiv' for 'latest_bioRxiv_entries.txt'
+def source_name(file):
+    return source_names[os.path.basename(file).split('_')[1].lower()]
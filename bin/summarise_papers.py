@@ -9,29 +9,12 @@
 # Copyright (C) 2024 Cyan Ching, PhD student at The Physical Chemistry Curie Lab of Institut Curie in France.
 # This code is up to date as of October 2024.
 
-import os
 import argparse
 import sys
-from datetime import datetime
-
-def print_header():
-    header = r"""
-     ______                _            
-    \  ___)              | |           
-     \ \__   ___ ___ _  _| |_  _  _  _ 
-      > > \ / / (   ) |/     \| || || |
-     / /_\ v /| || || ( (| |) ) \| |/ |
-    /_____> <  \_)\_)\_)_   _/ \_   _/ 
-         / ^ \           | |     | |   
-        /_/ \_\          |_|     |_|   
-    
-    Welcome to Scitify - Your Custom New Scientific Publication Notifier!
-    
-    Author: Cyan Ching, PhD Student at Institut Curie
-    Version: 1.0 | Date: October 2024
-    
-    """
-    print(header)
+from scitify_banner import print_header
+import re
+import heapq
+from scitify_sources import source_name, no_entries_message
 
 if __name__ == "__main__":
     print_header()
@@ -71,56 +54,56 @@ files = ["../output/latest_arxiv_entries.txt", "../output/latest_bioRxiv_entries
 # Output file name
 output_file = "../output/titles_and_urls.txt"
 
-# Helper function to extract information from text files
+# Pattern matching the Title, Date, and URL lines of one entry, where entries are separated by empty lines
+entry_pattern = re.compile(r"^Title: (.*)\n(?:.+\n)*?Date: (.*)\n(?:.+\n)*?URL: (.*)$", re.M)
+
+# Helper function to extract information from text files, scanning the whole file with one regular expression
+# Returns None if the file does not exist, i.e. no entries were retrieved from that source
 def extract_entries(file):
-    entries = []
-    if os.path.exists(file):
+    try:
         with open(file, "r") as f:
-            entry = {}
-            for line in f:
-                line = line.strip()
-                if line.startswith("Title:"):
-                    entry["title"] = line[len("Title: "):]
-                elif line.startswith("Date:"):
-                    try:
-                        date_str = line[len("Date: "):]
-                        entry["date"] = datetime.strptime(date_str, "%Y-%m-%d")
-                    except ValueError:
-                        entry["date"] = None
-                elif line.startswith("URL:"):
-                    entry["url"] = line[len("URL: "):]
-                elif line == "":  # An empty line indicates the end of an entry
-                    if "title" in entry and "date" in entry and "url" in entry:
-                        entries.append(entry)
-                    entry = {}
+            data = f.read()
+    except FileNotFoundError:
+        return None
+
+    entries = []
+    for match in entry_pattern.finditer(data):
+        title, date_str, url = match.groups()
+        # Turn a YYYY-MM-DD date into a sortable YYYYMMDD integer; unknown dates become 0 and are listed last
+        date_str = date_str.strip()
+        digits = date_str[:4] + date_str[5:7] + date_str[8:10]
+        if len(date_str) == 10 and date_str[4] == '-' and date_str[7] == '-' and digits.isdigit():
+            date = int(digits)
+        else:
+            date = 0
+        entries.append({"title": title.strip(), "date": date, "url": url.strip()})
     return entries
 
-# Extract entries from all files
-all_entries = []
+# Extract entries from all files, sorting each source by publication date (newest first) on its own
+source_entries = []
+missing_files = []
 for file in files:
-    if os.path.exists(file):
-        all_entries.extend(extract_entries(file))
+    entries = extract_entries(file)
+    if entries is None:
+        missing_files.append(file)
+    else:
+        entries.sort(key=lambda x: x["date"], reverse=True)
+        source_entries.append(entries)
 
-# Sort all entries by publication date (newest first)
-all_entries = sorted(all_entries, key=lambda x: x["date"], reverse=True)
+# Merge the sorted sources into one list of all entries (newest first), without sorting the combined list again
+all_entries = list(heapq.merge(*source_entries, key=lambda x: x["date"], reverse=True))
 
-# Open the output file for writing and collect the content for the file
+# Open the output file for writing and write the title and URL of every entry in a single call
 with open(output_file, "w") as output:
     if all_entries:
-        for entry in all_entries:
-            title = entry.get("title")
-            url = entry.get("url")
-            entry_content = f"{title}\n{url}\n\n"
-            output.write(entry_content)
+        output.write("".join(f"{entry['title']}\n{entry['url']}\n\n" for entry in all_entries))
     else:
-        output.write("No entries found for the given sources.\n")
+        output.write(no_entries_message)
 
 print(f"Titles and URLs have been successfully written to /Scitify/output/titles_and_urls.txt.")
 
 # Include messages for missing files
-for file in files:
-    if not os.path.exists(file):
-        source_name = os.path.basename(file).split('_')[1]
-        print(f"No entries were found for {source_name}.")
+for file in missing_files:
+    print(f"No entries were found for {source_name(file)}.")
 
 
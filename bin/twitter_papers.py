@@ -10,30 +10,13 @@
 # Copyright (C) 2024 Cyan Ching, PhD student at The Physical Chemistry Curie Lab of Institut Curie in France.
 # This code is up to date as of October 2024.
 
-import tweepy
-import keyring
+from itertools import zip_longest
+import json
 import argparse
 import os
 import sys
-
-def print_header():
-    header = r"""
-     ______                _            
-    \  ___)              | |           
-     \ \__   ___ ___ _  _| |_  _  _  _ 
-      > > \ / / (   ) |/     \| || || |
-     / /_\ v /| || || ( (| |) ) \| |/ |
-    /_____> <  \_)\_)\_)_   _/ \_   _/ 
-         / ^ \           | |     | |   
-        /_/ \_\          |_|     |_|   
-    
-    Welcome to Scitify - Your Custom New Scientific Publication Notifier!
-    
-    Author: Cyan Ching, PhD Student at Institut Curie
-    Version: 1.0 | Date: October 2024
-    
-    """
-    print(header)
+from scitify_banner import print_header
+from scitify_sources import no_entries_message
 
 if __name__ == "__main__":
     print_header()
@@ -93,38 +76,77 @@ file_path = '../output/titles_and_urls.txt'
 # Check for errors in parallel (missing credentials key or missing file)
 check_errors(args, file_path)
 
-# Retrieve Twitter credentials from keyring
-bearer_token = keyring.get_password(args.credentials_key, "bearer_token")
-api_key = keyring.get_password(args.credentials_key, "api_key")
-api_key_secret = keyring.get_password(args.credentials_key, "api_key_secret")
-access_token = keyring.get_password(args.credentials_key, "access_token")
-access_token_secret = keyring.get_password(args.credentials_key, "access_token_secret")
+# Read the titles and URLs to tweet
+with open(file_path, 'r') as file:
+    summary = file.read()
+
+# Nothing to tweet if the summary only says that no entries were found, so skip logging in to Twitter
+if summary == no_entries_message:
+    print("No new entries to tweet, skipping Twitter.")
+    sys.exit(0)
+
+# Import the heavy modules only now, so that --help and argument errors do not wait for them to load
+import asyncio
+import aiohttp
+import tweepy
+from tweepy.asynchronous import AsyncClient
+import keyring
+
+# Retrieve Twitter credentials from keyring, stored together as one JSON entry so that a single lookup is needed
+credential_fields = ['bearer_token', 'api_key', 'api_key_secret', 'access_token', 'access_token_secret']
+credentials = keyring.get_password(args.credentials_key, "all")
+if credentials:
+    credentials = json.loads(credentials)
+else:
+    # Fall back to the separate entries stored by earlier versions of 'twitter_setup.py'
+    credentials = {field: keyring.get_password(args.credentials_key, field) for field in credential_fields}
+bearer_token, api_key, api_key_secret, access_token, access_token_secret = [credentials.get(field) for field in credential_fields]
 
 # Ensure all credentials are available
 if not all([bearer_token, api_key, api_key_secret, access_token, access_token_secret]):
     print(f"Error: One or more credentials are missing for the key '{args.credentials_key}'.")
     sys.exit(1)
 
-# Initialize the Client (v2) using credentials from keyring
-client = tweepy.Client(bearer_token, api_key, api_key_secret, access_token, access_token_secret)
-
-# Open the 'titles_and_urls.txt' file and read each pair of title and URL
-with open(file_path, 'r') as file:
-    lines = [line.strip() for line in file if line.strip()]  # Remove empty lines and whitespace
-
-# Post each title and URL sequentially as a tweet
-for i in range(0, len(lines), 2):  # Iterate two lines at a time (title + URL)
-    if i + 1 < len(lines):  # Ensure there is a URL after the title
-        title = lines[i]  # Take the title
-        url = lines[i + 1]  # Take the corresponding URL
-        tweet = f"{title}\n{url}"  # Combine title and URL into one tweet
-        try:
-            client.create_tweet(text=tweet)
-            print(f'Successfully tweeted: {tweet}')
-        except tweepy.errors.TweepyException as e:
-            print(f'Failed to tweet: {tweet}, due to: {e}')
-    else:
-        print(f"Warning: No URL found for the title: {lines[i]}")
+# Post one tweet; returns whether it was posted
+async def post(client, tweet):
+    try:
+        await client.create_tweet(text=tweet)
+        print(f'Successfully tweeted: {tweet}')
+        return True
+    except tweepy.errors.Forbidden as e:
+        # Twitter refuses the same text twice, so a tweet already posted by an earlier run counts as posted
+        if any("duplicate content" in message for message in e.api_messages):
+            print(f'Already tweeted: {tweet}')
+            return True
+        print(f'Failed to tweet: {tweet}, due to: {e}')
+        return False
+    except (tweepy.errors.TweepyException, aiohttp.ClientError) as e:
+        print(f'Failed to tweet: {tweet}, due to: {e}')
+        return False
+
+# Read each pair of title and URL from the summary lines and combine them into one tweet
+def read_tweets(summary_lines):
+    lines = (line.strip() for line in summary_lines if line.strip())  # Skip empty lines and whitespace
+    # Pair consecutive lines (title + URL); a last title without a URL is paired with None
+    for title, url in zip_longest(lines, lines):
+        if url is None:
+            print(f"Warning: No URL found for the title: {title}")
+        else:
+            yield f"{title}\n{url}"
+
+# Post the tweets through the asynchronous Client (v2), using credentials from keyring
+# They are posted one after another rather than concurrently, so that they appear on the timeline in the digest's order
+async def main():
+    client = AsyncClient(bearer_token, api_key, api_key_secret, access_token, access_token_secret)
+    # Share one HTTP session across all tweets, so the connection and TLS handshake are reused
+    async with aiohttp.ClientSession() as session:
+        client.session = session
+        results = [await post(client, tweet) for tweet in read_tweets(summary.splitlines())]
+    return all(results)
+
+# Exit with an error status if any tweet could not be posted
+if not asyncio.run(main()):
+    sys.exit(1)
 
 
 
@@ -11,41 +11,25 @@
 # Copyright (C) 2024 Cyan Ching, PhD student at The Physical Chemistry Curie Lab of Institut Curie in France.
 # This code is up to date as of October 2024.
 
-import keyring
-import configparser
+import json
 import argparse
 import os
 import sys
-
-def print_header():
-    header = r"""
-     ______                _            
-    \  ___)              | |           
-     \ \__   ___ ___ _  _| |_  _  _  _ 
-      > > \ / / (   ) |/     \| || || |
-     / /_\ v /| || || ( (| |) ) \| |/ |
-    /_____> <  \_)\_)\_)_   _/ \_   _/ 
-         / ^ \           | |     | |   
-        /_/ \_\          |_|     |_|   
-    
-    Welcome to Scitify - Your Custom New Scientific Publication Notifier!
-    
-    Author: Cyan Ching, PhD Student at Institut Curie
-    Version: 1.0 | Date: October 2024
-    
-    """
-    print(header)
+from scitify_banner import print_header
 
 if __name__ == "__main__":
     print_header()
 
+# Credential fields required in the txt file, in the order they are reported and stored
+required_fields = ('bearer_token', 'api_key', 'api_key_secret', 'access_token', 'access_token_secret')
+
 # Helper function for error handling when missing required fields in the txt file
 def validate_txt_file(config):
-    required_fields = ['bearer_token', 'api_key', 'api_key_secret', 'access_token', 'access_token_secret']
-    missing_fields = [field for field in required_fields if not config.has_option('DEFAULT', field)]
+    missing_fields = frozenset(required_fields) - config.keys()
     
     if missing_fields:
-        raise ValueError(f"Error: Missing required fields in the txt file: {', '.join(missing_fields)}")
+        missing_list = ', '.join(field for field in required_fields if field in missing_fields)
+        raise ValueError(f"Error: Missing required fields in the txt file: {missing_list}")
 
 # Custom function to display the help message
 def print_help():
@@ -89,9 +73,16 @@ if not os.path.exists(file_path):
     print(f"Error: The file '{file_path}' does not exist.")
     sys.exit(1)
 
-# Read the credentials from the txt file
-config = configparser.ConfigParser(interpolation=None)
-config.read(file_path)
+# Import the heavy modules only now, so that --help and argument errors do not wait for them to load
+import keyring
+
+# Read the 'key="value"' credential lines of the txt file, ignoring the [DEFAULT] header, comments, and any surrounding quotes
+config = {}
+with open(file_path, 'r') as f:
+    for line in f:
+        if '=' in line and not line.lstrip().startswith(('#', ';')):
+            key, value = line.split('=', 1)
+            config[key.strip().lower()] = value.strip().strip('"')
 
 # Validate that all required fields are present in the txt file
 try:
@@ -100,28 +91,19 @@ except ValueError as e:
     print(e)
     sys.exit(1)
 
-# Extract credentials
-bearer_token = config.get('DEFAULT', 'bearer_token').strip('"')
-api_key = config.get('DEFAULT', 'api_key').strip('"')
-api_key_secret = config.get('DEFAULT', 'api_key_secret').strip('"')
-access_token = config.get('DEFAULT', 'access_token').strip('"')
-access_token_secret = config.get('DEFAULT', 'access_token_secret').strip('"')
-
-# Save the credentials in the keyring
-keyring.set_password(args.service_name, "bearer_token", bearer_token)
-keyring.set_password(args.service_name, "api_key", api_key)
-keyring.set_password(args.service_name, "api_key_secret", api_key_secret)
-keyring.set_password(args.service_name, "access_token", access_token)
-keyring.set_password(args.service_name, "access_token_secret", access_token_secret)
+# Save the credentials in the keyring, together as one JSON entry so that they are read back in a single lookup
+credentials = {field: config[field] for field in required_fields}
+keyring.set_password(args.service_name, "all", json.dumps(credentials))
 
 print(f"Credentials for {args.service_name} have been securely stored in the keyring.")
 
 # Retrieve the credentials from the keyring for verification
-bearer_token = keyring.get_password(args.service_name, "bearer_token")
-api_key = keyring.get_password(args.service_name, "api_key")
-api_key_secret = keyring.get_password(args.service_name, "api_key_secret")
-access_token = keyring.get_password(args.service_name, "access_token")
-access_token_secret = keyring.get_password(args.service_name, "access_token_secret")
+stored = json.loads(keyring.get_password(args.service_name, "all") or "{}")
+bearer_token = stored.get("bearer_token")
+api_key = stored.get("api_key")
+api_key_secret = stored.get("api_key_secret")
+access_token = stored.get("access_token")
+access_token_secret = stored.get("access_token_secret")
 
 # Check if credentials were retrieved successfully
 if all([bearer_token, api_key, api_key_secret, access_token, access_token_secret]):